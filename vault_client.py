@@ -1,12 +1,49 @@
 # vault_client.py
 import hvac
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import json
 import os
+import tempfile
+import time
 
 # Load environment variables from .env
 load_dotenv()
 
+# Short-lived on-disk cache so warm invocations skip the AppRole login and
+# KV reads (three network round-trips) entirely
+CACHE_PATH = os.path.expanduser("~/.cache/cloudocr/secrets.json")
+CACHE_TTL_SECONDS = 600
+
+def read_cached_secrets():
+    try:
+        if time.time() - os.path.getmtime(CACHE_PATH) < CACHE_TTL_SECONDS:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            return cached["project_id"], cached["processor_id"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # Missing, stale or corrupt cache: fall back to Vault
+    return None
+
+def write_cached_secrets(project_id, processor_id):
+    try:
+        cache_dir = os.path.dirname(CACHE_PATH)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file and replace atomically so a concurrent run
+        # never reads a partial cache; keep it owner-only since it holds ids
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"project_id": project_id, "processor_id": processor_id}, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError as e:
+        print(f"Could not write secrets cache: {str(e)}")
+
 def get_vault_secrets():
+    cached = read_cached_secrets()
+    if cached:
+        return cached
+
     # Set the Vault URL and AppRole credentials
     vault_url = os.getenv("vault_url")
     role_id = os.getenv("role_id")
@@ -31,31 +68,36 @@ def get_vault_secrets():
     # Set the client token to be used in further requests
     client.token = client_token
 
-    # Verify if the client is authenticated
-    print(f"Is client authenticated in Vault: {client.is_authenticated()}")
+    # The lookup-self verification costs a full network round-trip per run
+    # purely for a log line; only pay it when debugging
+    if os.getenv("VAULT_DEBUG"):
+        print(f"Is client authenticated in Vault: {client.is_authenticated()}")
 
     # Retrieve the project_id and processor_id from the Vault KV store
     project_id_path = os.getenv("project_id_path")  # Path for project_id
     processor_id_path = os.getenv("processor_id_path")  # Path for processor_id
 
     try:
-        # Read the project_id
-        project_id_response = client.secrets.kv.v2.read_secret_version(
-            path=project_id_path,
-            mount_point='kv',
-            raise_on_deleted_version=True
-        )
-        project_id = project_id_response['data']['data']['id']  # Retrieve project_id
-
-        # Read the processor_id
-        processor_id_response = client.secrets.kv.v2.read_secret_version(
-            path=processor_id_path,
-            mount_point='kv',
-            raise_on_deleted_version=True
-        )
-        processor_id = processor_id_response['data']['data']['id']  # Retrieve processor_id
-
-        # Return the retrieved values
+        # Read both secrets concurrently: each is an independent network
+        # round-trip, and hvac's requests session releases the GIL during I/O
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            project_id_future = executor.submit(
+                client.secrets.kv.v2.read_secret_version,
+                path=project_id_path,
+                mount_point='kv',
+                raise_on_deleted_version=True
+            )
+            processor_id_future = executor.submit(
+                client.secrets.kv.v2.read_secret_version,
+                path=processor_id_path,
+                mount_point='kv',
+                raise_on_deleted_version=True
+            )
+            project_id = project_id_future.result()['data']['data']['id']  # Retrieve project_id
+            processor_id = processor_id_future.result()['data']['data']['id']  # Retrieve processor_id
+
+        # Cache and return the retrieved values
+        write_cached_secrets(project_id, processor_id)
         return project_id, processor_id
 
     except Exception as e: